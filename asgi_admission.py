@@ -0,0 +1,404 @@
+"""
+Admission control and backpressure for the ASGI application.
+
+AdmissionMiddleware sits in front of the FastAPI app and decides, before
+any handler or database work starts, whether a request runs now, waits
+briefly, or is turned away:
+
+- per-user token bucket rate limit (opt-in)   -> 429 + Retry-After
+- per-user concurrency limit (opt-in)         -> 429 + Retry-After
+- per-route-class concurrency limits          -> bounded wait, then 503
+- global concurrency limit with priority queue -> bounded wait, then 503
+
+Requests are classified by method and path. Interactive writes such as
+``PATCH /api/tasks/{id}/complete`` get the highest priority and bulk work
+(stats, export, import, batch) the lowest: when the wait queue is full a
+higher-priority request evicts the lowest-priority waiter instead of being
+rejected itself.
+
+Per-user limits are off by default and keyed on the client IP. Behind
+Vercel or any other reverse proxy the socket peer is the proxy, so
+without further configuration every request shares one "user" budget.
+Set trusted_proxy_hops (ADMISSION_TRUSTED_PROXY_HOPS) to the number of
+proxies in front of the app to key on the right-most untrusted
+X-Forwarded-For entry instead. Alternatively a user header can be used,
+but only if it is set by a trusted proxy or auth layer that strips any
+client-supplied value: otherwise a client can dodge every per-user limit,
+and evict other users' rate buckets, by sending a new value on each
+request.
+
+Current limits and queue depths are served as JSON on /admission.
+"""
+
+import asyncio
+import heapq
+import itertools
+import json
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+
+# (name, priority, methods or None for any, path pattern); first match wins.
+# Lower priority values are admitted first.
+ROUTE_CLASSES = (
+    ("interactive", 0, {"PATCH"}, re.compile(r"^/api/tasks/\d+/(complete|incomplete)$")),
+    ("bulk", 2, None, re.compile(r"^/api/tasks/(stats|export|import|batch)(/|$)")),
+    ("write", 1, {"POST", "PUT", "PATCH", "DELETE"}, re.compile(r"^/api/")),
+    ("read", 1, None, re.compile(r"^/api/")),
+)
+DEFAULT_CLASS = ("other", 1)
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted."""
+
+    def __init__(self, status, detail, retry_after):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.retry_after = retry_after
+
+
+class PriorityLimiter:
+    """Concurrency limiter with a bounded, priority-ordered wait queue.
+
+    Args:
+        limit: Maximum concurrently admitted requests.
+        max_waiting: Maximum queued requests; beyond this the lowest
+            priority waiter (or the newcomer) is rejected.
+    """
+
+    def __init__(self, limit, max_waiting):
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.rejected = 0
+        self._waiters = []
+        self._seq = itertools.count()
+
+    @property
+    def waiting(self):
+        return len(self._waiters)
+
+    async def acquire(self, priority, timeout):
+        """Wait up to ``timeout`` seconds for a slot.
+
+        Raises:
+            Rejected: If the queue is full or the wait times out.
+        """
+        self._prune()
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+
+        if len(self._waiters) >= self.max_waiting:
+            worst = max(self._waiters, default=None)
+            if worst is None or worst[0] <= priority:
+                self.rejected += 1
+                raise Rejected(503, "Server busy, queue full", timeout)
+            self._discard(worst)
+            self.rejected += 1
+            worst[2].set_exception(Rejected(503, "Server busy, preempted", timeout))
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._seq), future)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self._abandon(entry)
+            self.rejected += 1
+            raise Rejected(503, "Server busy, timed out waiting", timeout)
+        except Rejected:
+            raise
+        except BaseException:
+            self._abandon(entry)
+            raise
+
+    def release(self):
+        """Free a slot, handing it directly to the best waiter if any."""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    def snapshot(self):
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "max_waiting": self.max_waiting,
+            "rejected": self.rejected,
+        }
+
+    def _abandon(self, entry):
+        """Leave the queue, giving back a slot if release() already handed one over.
+
+        wait_for can raise (timeout or cancellation) after the future has
+        its result, in which case this waiter owns a slot it will never use.
+        """
+        future = entry[2]
+        if future.done() and not future.cancelled() and future.exception() is None:
+            self.release()
+        else:
+            self._discard(entry)
+
+    def _prune(self):
+        """Drop waiters whose futures are already done (cancelled or preempted)."""
+        if any(future.done() for _, _, future in self._waiters):
+            self._waiters = [entry for entry in self._waiters if not entry[2].done()]
+            heapq.heapify(self._waiters)
+
+    def _discard(self, entry):
+        try:
+            self._waiters.remove(entry)
+        except ValueError:
+            return
+        heapq.heapify(self._waiters)
+
+
+class TokenBucketRegistry:
+    """Per-key token buckets, keeping at most ``max_keys`` recent keys.
+
+    Args:
+        rate: Tokens added per second.
+        burst: Bucket capacity.
+        max_keys: Least recently seen keys are dropped beyond this.
+    """
+
+    def __init__(self, rate, burst, max_keys=10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+
+    def take(self, key):
+        """Take one token for ``key``; return 0 or seconds until one is available."""
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        if len(self._buckets) > self.max_keys:
+            self._buckets.popitem(last=False)
+        return wait
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+def classify(method, path):
+    """Return (class name, priority) for a request."""
+    for name, priority, methods, pattern in ROUTE_CLASSES:
+        if (methods is None or method in methods) and pattern.match(path):
+            return name, priority
+    return DEFAULT_CLASS
+
+
+class AdmissionMiddleware:
+    """ASGI middleware enforcing rate, concurrency and queue limits.
+
+    Args:
+        app: The ASGI application to wrap.
+        max_concurrency: Requests running at once across the process.
+        max_queue: Requests allowed to wait for a global slot.
+        queue_timeout: Seconds a request may wait in total, across the
+            class and global limiters, before a 503.
+        class_limits: Optional {route class: max concurrency}.
+        per_user_concurrency: Requests one user may have running at once
+            (None disables).
+        rate: Sustained requests per second per user (None disables).
+        burst: Token bucket capacity per user.
+        user_header: Optional header identifying the user, set by a trusted
+            proxy or auth layer. Requests are keyed on client IP when it is
+            not configured or not present.
+        trusted_proxy_hops: Number of reverse proxies in front of the app
+            that append to X-Forwarded-For. When set, the client IP is the
+            entry that many places from the right; when 0 it is the socket
+            peer, which behind a proxy is the proxy itself.
+        stats_path: Path serving the current limiter state as JSON.
+    """
+
+    def __init__(
+        self,
+        app,
+        max_concurrency=32,
+        max_queue=64,
+        queue_timeout=5.0,
+        class_limits=None,
+        per_user_concurrency=None,
+        rate=None,
+        burst=20,
+        user_header=None,
+        trusted_proxy_hops=0,
+        stats_path="/admission",
+    ):
+        self.app = app
+        self.queue_timeout = queue_timeout
+        self.per_user_concurrency = per_user_concurrency
+        self.user_header = user_header.lower().encode() if user_header else None
+        self.trusted_proxy_hops = trusted_proxy_hops
+        self.stats_path = stats_path
+        self.global_limiter = PriorityLimiter(max_concurrency, max_queue)
+        self.class_limiters = {
+            name: PriorityLimiter(limit, max_queue)
+            for name, limit in (class_limits or {}).items()
+        }
+        self.buckets = TokenBucketRegistry(rate, burst) if rate else None
+        self.user_active = {}
+        self.user_rejected = 0
+
+    @classmethod
+    def from_env(cls, app):
+        """Build the middleware from ADMISSION_* environment variables.
+
+        ADMISSION_RATE and ADMISSION_PER_USER_CONCURRENCY default to 0
+        (off). Behind a reverse proxy, only enable them together with
+        ADMISSION_TRUSTED_PROXY_HOPS, or with ADMISSION_USER_HEADER set by
+        a trusted proxy or auth layer; otherwise all clients share the
+        proxy's budget.
+        """
+        rate = os.getenv("ADMISSION_RATE", "0")
+        per_user = int(os.getenv("ADMISSION_PER_USER_CONCURRENCY", "0"))
+        return cls(
+            app,
+            max_concurrency=int(os.getenv("ADMISSION_MAX_CONCURRENCY", "32")),
+            max_queue=int(os.getenv("ADMISSION_MAX_QUEUE", "64")),
+            queue_timeout=float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "5")),
+            class_limits={"bulk": int(os.getenv("ADMISSION_BULK_CONCURRENCY", "4"))},
+            per_user_concurrency=per_user or None,
+            rate=float(rate) or None,
+            burst=int(os.getenv("ADMISSION_BURST", "20")),
+            user_header=os.getenv("ADMISSION_USER_HEADER") or None,
+            trusted_proxy_hops=int(os.getenv("ADMISSION_TRUSTED_PROXY_HOPS", "0")),
+        )
+
+    def snapshot(self):
+        """Return current limits, active counts and queue depths."""
+        return {
+            "global": self.global_limiter.snapshot(),
+            "classes": {
+                name: limiter.snapshot() for name, limiter in self.class_limiters.items()
+            },
+            "users": {
+                "active": len(self.user_active),
+                "per_user_concurrency": self.per_user_concurrency,
+                "rate": self.buckets.rate if self.buckets is not None else None,
+                "rejected": self.user_rejected,
+                "rate_limited_keys": len(self.buckets) if self.buckets is not None else 0,
+            },
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if scope["path"] == self.stats_path:
+            await self._send_json(send, 200, self.snapshot())
+            return
+
+        user = self._user_key(scope)
+        route_class, priority = classify(scope["method"], scope["path"])
+        releases = []
+        try:
+            self._check_user(user)
+            self.user_active[user] = self.user_active.get(user, 0) + 1
+            releases.append(lambda: self._release_user(user))
+
+            # One deadline for both limiters, so the total wait stays within
+            # queue_timeout rather than up to twice it
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.queue_timeout
+            class_limiter = self.class_limiters.get(route_class)
+            if class_limiter is not None:
+                await class_limiter.acquire(priority, self.queue_timeout)
+                releases.append(class_limiter.release)
+            await self.global_limiter.acquire(priority, max(0.0, deadline - loop.time()))
+            releases.append(self.global_limiter.release)
+        except Rejected as exc:
+            self._release_all(releases)
+            # Rejected requests never reach routing; let metrics label them
+            scope["admission_rejected"] = route_class
+            # Overload (503) retries after a full queue wait, not whatever
+            # remained of this request's deadline
+            retry_after = exc.retry_after if exc.status == 429 else self.queue_timeout
+            await self._send_json(
+                send,
+                exc.status,
+                {"detail": exc.detail},
+                [(b"retry-after", str(max(1, math.ceil(retry_after))).encode())],
+            )
+            return
+        except BaseException:
+            self._release_all(releases)
+            raise
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._release_all(releases)
+
+    @staticmethod
+    def _release_all(releases):
+        for release in reversed(releases):
+            release()
+
+    def _user_key(self, scope):
+        headers = scope.get("headers", ())
+        if self.user_header is not None:
+            for name, value in headers:
+                if name == self.user_header:
+                    return value.decode("latin-1")
+        if self.trusted_proxy_hops:
+            forwarded = ",".join(
+                value.decode("latin-1") for name, value in headers if name == b"x-forwarded-for"
+            )
+            entries = [entry.strip() for entry in forwarded.split(",") if entry.strip()]
+            if entries:
+                # Each trusted proxy appends its peer; anything further left
+                # was supplied by the client and cannot be trusted
+                return entries[-min(self.trusted_proxy_hops, len(entries))]
+        client = scope.get("client")
+        return client[0] if client else "anonymous"
+
+    def _check_user(self, user):
+        if self.buckets is not None:
+            wait = self.buckets.take(user)
+            if wait:
+                self.user_rejected += 1
+                raise Rejected(429, "Rate limit exceeded", wait)
+        if (
+            self.per_user_concurrency is not None
+            and self.user_active.get(user, 0) >= self.per_user_concurrency
+        ):
+            self.user_rejected += 1
+            raise Rejected(429, "Too many concurrent requests", 1)
+
+    def _release_user(self, user):
+        remaining = self.user_active.get(user, 0) - 1
+        if remaining > 0:
+            self.user_active[user] = remaining
+        else:
+            self.user_active.pop(user, None)
+
+    @staticmethod
+    async def _send_json(send, status, payload, extra_headers=()):
+        body = json.dumps(payload).encode()
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                *extra_headers,
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -3,8 +3,17 @@ Vercel serverless handler for FastAPI application.
 
 This is the entry point for Vercel's Python builder.
 Vercel automatically wraps this ASGI application for serverless execution.
+
+By default the FastAPI application (and everything it pulls in: SQLModel,
+the async engine, schemas and routers) is imported on the first request
+rather than at module load. The imported application is kept for the life
+of the process, so warm invocations reuse it and its database engine.
+Set ASGI_EAGER_IMPORT=1 to import it at module load instead.
+
+Use profile_imports.py to measure where import time goes.
 """
 
+import os
 import sys
 from pathlib import Path
 
@@ -13,9 +22,59 @@ backend_dir = Path(__file__).parent / "backend"
 if str(backend_dir) not in sys.path:
     sys.path.insert(0, str(backend_dir))
 
-# Import and export the FastAPI ASGI application
+
+def load_app():
+    """Import and return the FastAPI application from the backend package."""
+    from api.main import app as fastapi_app
+
+    return fastapi_app
+
+
+class LazyASGIApp:
+    """ASGI application that imports the real app on first use.
+
+    Args:
+        loader: Zero-argument callable returning the ASGI application.
+    """
+
+    def __init__(self, loader):
+        self._loader = loader
+        self._app = None
+
+    @property
+    def loaded(self):
+        """Whether the wrapped application has been imported yet."""
+        return self._app is not None
+
+    async def __call__(self, scope, receive, send):
+        if self._app is None:
+            self._app = self._loader()
+        await self._app(scope, receive, send)
+
+
 # Vercel will automatically wrap this for serverless execution
-from api.main import app
+if os.getenv("ASGI_EAGER_IMPORT") == "1":
+    app = load_app()
+else:
+    app = LazyASGIApp(load_app)
+
+# Opt-in rate/concurrency limits; configured by ADMISSION_* variables
+if os.getenv("ASGI_ADMISSION") == "1":
+    from asgi_admission import AdmissionMiddleware
+
+    app = AdmissionMiddleware.from_env(app)
+
+# Opt-in request metrics on /metrics, and folded stacks for slow requests
+if os.getenv("ASGI_METRICS") == "1":
+    from asgi_metrics import MetricsMiddleware, SlowRequestProfiler
+
+    profiler = None
+    if os.getenv("ASGI_PROFILE_SLOW_MS"):
+        profiler = SlowRequestProfiler(
+            threshold_ms=float(os.environ["ASGI_PROFILE_SLOW_MS"]),
+            output_dir=os.getenv("ASGI_PROFILE_DIR", "profiles"),
+        )
+    app = MetricsMiddleware(app, profiler=profiler)
 
 # Vercel looks for 'app' in the module
 __all__ = ["app"]
@@ -0,0 +1,312 @@
+"""
+Request metrics and slow-request profiling for the ASGI application.
+
+MetricsMiddleware wraps any ASGI app and records, per route:
+- request counts by status code
+- latency histograms
+- database query count and time per request (via SQLAlchemy engine events)
+
+and serves them in Prometheus text format on /metrics.
+
+SlowRequestProfiler is an opt-in sampling profiler. While requests are in
+flight it samples the event loop thread's stack, and for requests slower
+than a threshold it writes the samples as folded stacks
+(``frame;frame;frame count``) that flamegraph.pl / speedscope read directly.
+The event loop is shared, so under concurrency a slow request's profile
+also contains whatever other requests were running at the time.
+"""
+
+import contextvars
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+# Prometheus client defaults, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# Any other request method is labelled OTHER to keep cardinality bounded
+KNOWN_METHODS = frozenset({"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"})
+
+_current_request = contextvars.ContextVar("current_request", default=None)
+_engine_hooks_installed = False
+
+
+class RequestStats:
+    """Per-request counters filled in by the SQLAlchemy event hooks."""
+
+    __slots__ = ("db_queries", "db_seconds", "_query_started")
+
+    def __init__(self):
+        self.db_queries = 0
+        self.db_seconds = 0.0
+        self._query_started = {}
+
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += value
+        self.count += 1
+
+
+def install_engine_hooks():
+    """Count queries and query time for every SQLAlchemy engine.
+
+    Listens on the Engine class, so engines created before or after this
+    call (including the sync engine behind an AsyncEngine) are covered.
+    Does nothing if SQLAlchemy is not installed.
+    """
+    global _engine_hooks_installed
+    if _engine_hooks_installed:
+        return
+    try:
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+    except ImportError:
+        return
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_request.get()
+        if stats is not None:
+            stats._query_started[id(context)] = time.perf_counter()
+
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        stats = _current_request.get()
+        if stats is None:
+            return
+        started = stats._query_started.pop(id(context), None)
+        stats.db_queries += 1
+        if started is not None:
+            stats.db_seconds += time.perf_counter() - started
+
+    event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+    _engine_hooks_installed = True
+
+
+def method_label(scope):
+    """Return the request method, or ``OTHER`` for non-standard methods."""
+    method = scope.get("method", "")
+    return method if method in KNOWN_METHODS else "OTHER"
+
+
+def route_label(scope):
+    """Return the matched route template, falling back to a fixed label.
+
+    Starlette records the matched route in the scope during routing; raw
+    paths are not used as labels to keep metric cardinality bounded.
+    Requests turned away by AdmissionMiddleware never reach routing and
+    are labelled ``rejected:<route class>`` instead.
+    """
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path:
+        return path
+    rejected_class = scope.get("admission_rejected")
+    if rejected_class:
+        return f"rejected:{rejected_class}"
+    return "unmatched"
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+class MetricsRegistry:
+    """In-process store for request metrics."""
+
+    def __init__(self):
+        self.requests = Counter()
+        self.latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.db_queries = defaultdict(lambda: Histogram(QUERY_COUNT_BUCKETS))
+        self.db_seconds = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+        self.in_flight = 0
+
+    def record(self, method, route, status, seconds, stats):
+        self.requests[(method, route, status)] += 1
+        key = (method, route)
+        self.latency[key].observe(seconds)
+        self.db_queries[key].observe(stats.db_queries)
+        self.db_seconds[key].observe(stats.db_seconds)
+
+    def render(self):
+        """Render all metrics in Prometheus text exposition format."""
+        lines = [
+            "# HELP http_requests_in_flight Requests currently being handled.",
+            "# TYPE http_requests_in_flight gauge",
+            f"http_requests_in_flight {self.in_flight}",
+            "# HELP http_requests_total Requests handled, by route and status.",
+            "# TYPE http_requests_total counter",
+        ]
+        for (method, route, status), count in sorted(self.requests.items()):
+            lines.append(
+                f"http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}"
+            )
+
+        histograms = (
+            ("http_request_duration_seconds", "Request latency.", self.latency),
+            ("http_request_db_queries", "Database queries per request.", self.db_queries),
+            ("http_request_db_seconds", "Database time per request.", self.db_seconds),
+        )
+        for name, help_text, series in histograms:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for (method, route), histogram in sorted(series.items()):
+                base = _labels(method=method, route=route)
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    lines.append(f'{name}_bucket{{{base},le="{bound}"}} {count}')
+                lines.append(f'{name}_bucket{{{base},le="+Inf"}} {histogram.count}')
+                lines.append(f"{name}_sum{{{base}}} {histogram.total}")
+                lines.append(f"{name}_count{{{base}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+class SlowRequestProfiler:
+    """Sample the event loop stack and dump folded stacks for slow requests.
+
+    Args:
+        threshold_ms: Requests slower than this are written out.
+        output_dir: Directory for ``.folded`` files (created if missing).
+        interval_ms: Sampling interval.
+    """
+
+    def __init__(self, threshold_ms, output_dir, interval_ms=5):
+        self.threshold = threshold_ms / 1000
+        self.output_dir = output_dir
+        self.interval = interval_ms / 1000
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._loop_thread_id = None
+
+    def start_request(self):
+        """Begin collecting samples; pass the result to finish_request()."""
+        samples = Counter()
+        with self._lock:
+            self._loop_thread_id = threading.get_ident()
+            self._active[id(samples)] = samples
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="slow-request-profiler", daemon=True
+                )
+                self._thread.start()
+        return samples
+
+    def finish_request(self, samples, method, route, seconds):
+        """Stop collecting and write the profile if the request was slow."""
+        with self._lock:
+            self._active.pop(id(samples), None)
+        if seconds < self.threshold or not samples:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_route = route.strip("/").replace("/", "_").replace("{", "").replace("}", "") or "root"
+        filename = f"{int(time.time() * 1000)}-{method}-{safe_route}-{int(seconds * 1000)}ms.folded"
+        with open(os.path.join(self.output_dir, filename), "w") as f:
+            for stack, count in samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is None:
+                    continue
+                stack = self._fold(frame)
+                for samples in self._active.values():
+                    samples[stack] += 1
+
+    @staticmethod
+    def _fold(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{frame.f_globals.get('__name__', '?')}:{code.co_name}")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording request metrics and serving /metrics.
+
+    Args:
+        app: The ASGI application to wrap.
+        metrics_path: Path that returns the Prometheus text output.
+        profiler: Optional SlowRequestProfiler.
+    """
+
+    def __init__(self, app, metrics_path="/metrics", profiler=None):
+        self.app = app
+        self.metrics_path = metrics_path
+        self.profiler = profiler
+        self.registry = MetricsRegistry()
+        self._hooks_checked = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        if not self._hooks_checked:
+            # Deferred so SQLAlchemy is not imported at cold start
+            install_engine_hooks()
+            self._hooks_checked = True
+        if scope["path"] == self.metrics_path:
+            await self._send_metrics(send)
+            return
+
+        stats = RequestStats()
+        token = _current_request.set(stats)
+        samples = self.profiler.start_request() if self.profiler else None
+        status = 500
+        registry = self.registry
+        registry.in_flight += 1
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            seconds = time.perf_counter() - start
+            registry.in_flight -= 1
+            _current_request.reset(token)
+            route = route_label(scope)
+            method = method_label(scope)
+            registry.record(method, route, status, seconds, stats)
+            if samples is not None:
+                self.profiler.finish_request(samples, method, route, seconds)
+
+    async def _send_metrics(self, send):
+        body = self.registry.render().encode()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", b"text/plain; version=0.0.4; charset=utf-8"),
+                (b"content-length", str(len(body)).encode()),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,503 @@
+#!/usr/bin/env python
+"""
+Benchmark Suite - Reproducible performance numbers for the hot paths.
+
+Measures:
+- TaskManager operations (add, get, update, complete, queries, counts, delete)
+- Persistence load (TaskManager(persistence_file=...)) and save per mutation
+- The FastAPI app in-process under concurrent load (optional, --api)
+
+Datasets are generated from a fixed seed so runs are comparable. Each
+TaskManager/persistence operation is timed timeit-style: batches of calls
+per sample, several rounds after a warm-up batch, keeping the min, median
+and max per-call time across rounds. Results can be stored as a baseline;
+--compare flags an operation only when its fastest round is slower than
+the baseline's slowest round by more than --tolerance, so run-to-run noise
+recorded in the baseline does not fail the gate. Saving the baseline over
+several separate invocations with --merge-baseline records the spread
+between processes as well as between rounds. Every run also times a
+fixed pure-Python calibration workload, and comparisons are scaled by the
+calibration ratio so a machine that is uniformly slower today (CPU
+frequency, noisy neighbours) is not reported as a regression. API
+latencies are reported against the baseline but not gated.
+
+Run with:
+    python benchmark.py --sizes 1000 10000
+    python benchmark.py --save-baseline bench_baseline.json --merge-baseline  # repeat 3-5x
+    python benchmark.py --compare bench_baseline.json
+    python benchmark.py --api --skip-task-manager
+    DATABASE_URL=postgresql+asyncpg://... python benchmark.py --api --api-reset
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+WORDS = [
+    "buy", "groceries", "cook", "dinner", "clean", "house", "study", "python",
+    "call", "mom", "exercise", "read", "book", "deploy", "review", "code",
+    "write", "docs", "plan", "trip", "pay", "bills", "fix", "bike",
+]
+
+# Default slack beyond the baseline's slowest round before flagging;
+# override per operation with --op-tolerance NAME=FRACTION
+DEFAULT_TOLERANCE = 0.25
+
+
+def print_header(title):
+    """Print a formatted header."""
+    print("\n" + "=" * 60)
+    print(f"  {title}")
+    print("=" * 60)
+
+
+def random_text(rng, min_words, max_words):
+    """Return a few random words joined by spaces."""
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+
+def generate_task_records(count, complete_ratio=0.3, seed=42):
+    """Generate task dicts in the tasks.json record format."""
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1)
+    records = []
+    for task_id in range(1, count + 1):
+        created_at = start + timedelta(seconds=task_id)
+        complete = rng.random() < complete_ratio
+        records.append({
+            "id": task_id,
+            "title": random_text(rng, 2, 5),
+            "description": random_text(rng, 0, 12),
+            "status": "complete" if complete else "pending",
+            "created_at": created_at.isoformat(),
+            "completed_at": (created_at + timedelta(hours=1)).isoformat() if complete else None,
+        })
+    return records
+
+
+def populate_manager(manager, records):
+    """Add generated records to an in-memory manager, preserving status."""
+    for record in records:
+        task = manager.add_task(record["title"], record["description"])
+        if record["status"] == "complete":
+            manager.mark_task_complete(task.id)
+
+
+def summarize_latencies(samples):
+    """Reduce per-request latencies (seconds) to throughput and percentiles."""
+    ordered = sorted(samples)
+
+    def percentile(p):
+        return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+    total = sum(ordered)
+    return {
+        "calls": len(ordered),
+        "ops_per_sec": len(ordered) / total if total else float("inf"),
+        "mean_us": statistics.fmean(ordered) * 1e6,
+        "p50_us": percentile(50) * 1e6,
+        "p95_us": percentile(95) * 1e6,
+        "p99_us": percentile(99) * 1e6,
+    }
+
+
+def summarize_rounds(per_call, batch):
+    """Reduce per-round, per-call times (seconds) to min/median/max."""
+    median = statistics.median(per_call)
+    return {
+        "batch": batch,
+        "rounds": len(per_call),
+        "ops_per_sec": 1 / median if median else float("inf"),
+        "min_us": min(per_call) * 1e6,
+        "median_us": median * 1e6,
+        "max_us": max(per_call) * 1e6,
+    }
+
+
+def measure(fn, args_iter, batch, rounds, warmup=1):
+    """Time ``fn`` timeit-style and return its min/median/max per-call time.
+
+    Runs ``warmup`` untimed batches, then ``rounds`` timed batches of
+    ``batch`` calls each. Arguments are drawn from ``args_iter`` outside
+    the timed region.
+    """
+    args_iter = iter(args_iter)
+    for _ in range(warmup):
+        for _ in range(batch):
+            fn(*next(args_iter))
+
+    per_call = []
+    for _ in range(rounds):
+        batch_args = [next(args_iter) for _ in range(batch)]
+        start = time.perf_counter()
+        for args in batch_args:
+            fn(*args)
+        per_call.append((time.perf_counter() - start) / batch)
+    return summarize_rounds(per_call, batch)
+
+
+def calibration_workload(data={i: str(i) for i in range(1000)}):
+    """Fixed dict/str work standing in for machine speed."""
+    return sum(len(value) for key, value in data.items() if key & 1)
+
+
+def calibrate(rounds):
+    """Return the median per-call time (us) of the calibration workload."""
+    return measure(calibration_workload, itertools.repeat(()), 100, rounds)["median_us"]
+
+
+def bench_task_manager(size, batch, rounds, seed):
+    """Micro-benchmark TaskManager operations on a dataset of ``size`` tasks."""
+    from src.services.task_manager import TaskManager
+
+    rng = random.Random(seed)
+    manager = TaskManager()
+    populate_manager(manager, generate_task_records(size, seed=seed))
+    ids = [(rng.randint(1, size),) for _ in range(batch)]
+    no_args = itertools.repeat(())
+
+    results = {}
+    results["add_task"] = measure(
+        manager.add_task, ((f"bench task {i}", "generated") for i in itertools.count()),
+        batch, rounds,
+    )
+    results["get_task_by_id"] = measure(manager.get_task_by_id, itertools.cycle(ids), batch, rounds)
+    results["update_task"] = measure(
+        lambda task_id: manager.update_task(task_id, title=f"updated {task_id}"),
+        itertools.cycle(ids), batch, rounds,
+    )
+    results["mark_task_complete"] = measure(
+        manager.mark_task_complete, itertools.cycle(ids), batch, rounds
+    )
+    results["mark_task_incomplete"] = measure(
+        manager.mark_task_incomplete, itertools.cycle(ids), batch, rounds
+    )
+
+    # Whole-list queries are O(size); fewer calls per batch keep rounds short
+    query_batch = max(1, batch // 10)
+    for name in ("get_pending_tasks", "get_completed_tasks", "count_pending", "count_completed"):
+        results[name] = measure(getattr(manager, name), no_args, query_batch, rounds)
+
+    # Each delete needs a distinct existing id across warm-up and all rounds
+    if size > rounds:
+        delete_batch = min(batch, size // (rounds + 1))
+        delete_ids = rng.sample(range(1, size + 1), delete_batch * (rounds + 1))
+        results["delete_task"] = measure(
+            manager.delete_task, ((i,) for i in delete_ids), delete_batch, rounds
+        )
+
+    return results
+
+
+def bench_persistence(size, rounds, seed):
+    """Benchmark loading a tasks.json of ``size`` tasks and saving on mutation."""
+    from src.services.task_manager import TaskManager
+
+    records = generate_task_records(size, seed=seed)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "tasks.json")
+        with open(path, "w") as f:
+            json.dump({"next_id": size + 1, "tasks": records}, f)
+        file_size = os.path.getsize(path)
+
+        load = measure(
+            lambda: TaskManager(persistence_file=path), itertools.repeat(()), 1, rounds
+        )
+
+        # Every mutation rewrites the file, so this measures save cost at ``size``
+        manager = TaskManager(persistence_file=path)
+        save_on_add = measure(
+            manager.add_task, ((f"persisted {i}",) for i in itertools.count()), 5, rounds
+        )
+
+    return {"file_bytes": file_size, "load": load, "save_on_add": save_on_add}
+
+
+async def reset_api_database(clear_tasks):
+    """Create the schema and optionally delete all existing tasks.
+
+    httpx's ASGI transport sends no lifespan events, so the schema is not
+    created by app startup and has to be initialised here.
+    """
+    from sqlalchemy import delete
+
+    # asgi_app puts backend/ on sys.path; import config the way the app
+    # does so both share one engine
+    from core.config import async_init_db, async_session
+    from core.models.task import Task
+
+    await async_init_db()
+    if clear_tasks:
+        async with async_session() as session:
+            await session.execute(delete(Task))
+            await session.commit()
+
+
+async def bench_api(requests_total, concurrency, seed_tasks, clear_tasks):
+    """Drive the ASGI app in-process with concurrent clients."""
+    import httpx
+    from asgi_app import app
+
+    await reset_api_database(clear_tasks)
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        created = []
+        for i in range(seed_tasks):
+            response = await client.post("/api/tasks", json={"title": f"api bench {i}"})
+            response.raise_for_status()
+            created.append(response.json()["id"])
+
+        rng = random.Random(0)
+        plan = [
+            ("GET /api/tasks", lambda: client.get("/api/tasks")),
+            ("GET /api/tasks/stats", lambda: client.get("/api/tasks/stats")),
+            ("GET /api/tasks/{id}", lambda: client.get(f"/api/tasks/{rng.choice(created)}")),
+            ("PATCH /api/tasks/{id}/complete",
+             lambda: client.patch(f"/api/tasks/{rng.choice(created)}/complete")),
+        ]
+        samples = {name: [] for name, _ in plan}
+        errors = 0
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def one_request(index):
+            nonlocal errors
+            name, make_request = plan[index % len(plan)]
+            async with semaphore:
+                start = time.perf_counter()
+                response = await make_request()
+                samples[name].append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one_request(i) for i in range(requests_total)))
+        elapsed = time.perf_counter() - start
+
+    routes = {name: summarize_latencies(values) for name, values in samples.items() if values}
+    return {
+        "requests": requests_total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "throughput_rps": requests_total / elapsed,
+        "routes": routes,
+    }
+
+
+def print_op_table(results):
+    """Print a table of operations measured in rounds."""
+    print(f"\n  {'operation':<32}{'ops/s':>12}{'min us':>10}{'median us':>11}{'max us':>10}")
+    for name, stats in results.items():
+        print(
+            f"  {name:<32}{stats['ops_per_sec']:>12.0f}{stats['min_us']:>10.2f}"
+            f"{stats['median_us']:>11.2f}{stats['max_us']:>10.2f}"
+        )
+
+
+def print_latency_table(results):
+    """Print a table of per-request latency percentiles."""
+    print(f"\n  {'operation':<32}{'ops/s':>12}{'p50 us':>10}{'p95 us':>10}{'p99 us':>10}")
+    for name, stats in results.items():
+        print(
+            f"  {name:<32}{stats['ops_per_sec']:>12.0f}{stats['p50_us']:>10.1f}"
+            f"{stats['p95_us']:>10.1f}{stats['p99_us']:>10.1f}"
+        )
+
+
+def flatten(report, prefix=""):
+    """Flatten nested results into {'path/to/op': stats} for comparison."""
+    flat = {}
+    for key, value in report.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict) and ("median_us" in value or "p50_us" in value):
+            flat[path] = value
+        elif isinstance(value, dict):
+            flat.update(flatten(value, path + "/"))
+    return flat
+
+
+def merge_baseline(old, new):
+    """Widen ``old``'s per-operation min/max with a new run's results.
+
+    Keeps the median of the per-run medians, so a baseline saved over
+    several invocations records the spread between processes, not just
+    between rounds of one process.
+    """
+    merged = dict(new)
+    merged["runs"] = old.get("runs", 1) + 1
+    merged["calibration_us"] = (
+        old["calibration_us"] * (merged["runs"] - 1) + new["calibration_us"]
+    ) / merged["runs"]
+
+    def merge(old_node, new_node):
+        if "median_us" in new_node and "median_us" in old_node:
+            medians = old_node.get("run_medians_us", [old_node["median_us"]])
+            medians = medians + [new_node["median_us"]]
+            return dict(
+                new_node,
+                min_us=min(old_node["min_us"], new_node["min_us"]),
+                max_us=max(old_node["max_us"], new_node["max_us"]),
+                median_us=statistics.median(medians),
+                run_medians_us=medians,
+            )
+        return {
+            key: merge(old_node[key], value)
+            if isinstance(value, dict) and isinstance(old_node.get(key), dict) else value
+            for key, value in new_node.items()
+        }
+
+    merged["results"] = merge(old["results"], new["results"])
+    return merged
+
+
+def parse_op_tolerance(value):
+    """Parse an ``--op-tolerance NAME=FRACTION`` argument."""
+    name, sep, fraction = value.partition("=")
+    try:
+        if not sep:
+            raise ValueError
+        return name, float(fraction)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected NAME=FRACTION, got {value!r}")
+
+
+def compare_to_baseline(report, baseline_path, tolerance, op_tolerances=None):
+    """Print timings against a stored baseline; return True if no regressions.
+
+    Current timings are first divided by the calibration ratio (this
+    run's machine speed relative to the baseline's). An operation then
+    regresses only if its fastest round is slower than the baseline's
+    slowest round by more than ``tolerance``, or by the entry in
+    ``op_tolerances`` keyed on the operation name (last path component). Single-run API percentiles
+    carry no spread, so they are shown but never flagged.
+    """
+    with open(baseline_path, "r") as f:
+        baseline_report = json.load(f)
+    baseline = flatten(baseline_report["results"])
+    current = flatten(report["results"])
+    scale = report["calibration_us"] / baseline_report["calibration_us"]
+
+    print_header(f"COMPARISON WITH {baseline_path}")
+    op_tolerances = op_tolerances or {}
+    print(f"\n  Calibration vs baseline: {scale:.2f}x (current timings divided by this)")
+    print(f"\n  {'operation':<52}{'median':>9}  (flagged if scaled min > baseline max x 1+tolerance)")
+    regressions = 0
+    for path in sorted(current):
+        now, then = current[path], baseline.get(path)
+        if then is None:
+            continue
+        if "median_us" in now and "median_us" in then and then["median_us"]:
+            ratio = now["median_us"] / scale / then["median_us"]
+            flag = ""
+            allowed = op_tolerances.get(path.rsplit("/", 1)[-1], tolerance)
+            if now["min_us"] / scale > then["max_us"] * (1 + allowed):
+                flag = "  [REGRESSION]"
+                regressions += 1
+            print(f"  {path:<52}{ratio:>8.2f}x{flag}")
+        elif "p50_us" in now and "p50_us" in then and then["p50_us"]:
+            ratio = now["p50_us"] / then["p50_us"]
+            print(f"  {path:<52}{ratio:>8.2f}x  (p50, not gated)")
+
+    if regressions:
+        print(f"\n[ERROR] {regressions} operation(s) slower than baseline")
+    else:
+        print("\n[OK] No regressions against baseline")
+    return regressions == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Todo app benchmark suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="dataset sizes in tasks (1k-1M)")
+    parser.add_argument("--batch", type=int, default=1000, help="calls per timed batch")
+    parser.add_argument("--rounds", type=int, default=7, help="timed batches per operation")
+    parser.add_argument("--skip-task-manager", action="store_true",
+                        help="skip TaskManager and persistence benchmarks")
+    parser.add_argument("--seed", type=int, default=42, help="dataset seed")
+    parser.add_argument("--api", action="store_true", help="also load-test the ASGI app")
+    parser.add_argument("--api-requests", type=int, default=2000)
+    parser.add_argument("--api-concurrency", type=int, default=50)
+    parser.add_argument("--api-seed-tasks", type=int, default=200)
+    parser.add_argument("--api-reset", action="store_true",
+                        help="delete all tasks in DATABASE_URL before seeding")
+    parser.add_argument("--save-baseline", metavar="PATH", help="write results as a baseline")
+    parser.add_argument("--merge-baseline", action="store_true",
+                        help="widen an existing --save-baseline file with this run")
+    parser.add_argument("--compare", metavar="PATH", help="compare results to a baseline")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown beyond the baseline's slowest round")
+    parser.add_argument("--op-tolerance", type=parse_op_tolerance, action="append", default=[],
+                        metavar="NAME=FRACTION", help="per-operation tolerance override")
+    args = parser.parse_args()
+
+    report = {
+        "python": sys.version.split()[0],
+        "seed": args.seed,
+        "batch": args.batch,
+        "rounds": args.rounds,
+        "results": {},
+    }
+    calibration_before = calibrate(args.rounds)
+
+    for size in [] if args.skip_task_manager else args.sizes:
+        print_header(f"TASKMANAGER - {size} TASKS")
+        ops = bench_task_manager(size, args.batch, args.rounds, args.seed)
+        print_op_table(ops)
+
+        print_header(f"PERSISTENCE - {size} TASKS")
+        persistence = bench_persistence(size, args.rounds, args.seed)
+        print(f"\n  File size: {persistence['file_bytes'] / 1024:.1f} KiB")
+        print_op_table({"load": persistence["load"], "save_on_add": persistence["save_on_add"]})
+
+        report["results"][f"task_manager_{size}"] = ops
+        report["results"][f"persistence_{size}"] = persistence
+
+    if args.api:
+        print_header("API LOAD TEST (in-process ASGI)")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # Must be set before asgi_app imports the backend config
+            if "DATABASE_URL" not in os.environ:
+                os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tmp_dir}/bench.db"
+                print(f"\n  Using fresh SQLite database in {tmp_dir}")
+            elif not args.api_reset:
+                print("\n[ERROR] DATABASE_URL is set; pass --api-reset to delete its tasks "
+                      "before seeding, or unset it to use a temporary SQLite database")
+                sys.exit(1)
+            api = asyncio.run(bench_api(
+                args.api_requests, args.api_concurrency, args.api_seed_tasks, args.api_reset
+            ))
+        print(f"\n  Throughput: {api['throughput_rps']:.0f} req/s "
+              f"({api['requests']} requests, concurrency {api['concurrency']}, "
+              f"{api['errors']} errors)")
+        print_latency_table(api["routes"])
+        report["results"]["api"] = api
+
+    # Calibrate on both sides of the run so drift during it is averaged in
+    report["calibration_us"] = (calibration_before + calibrate(args.rounds)) / 2
+
+    if args.save_baseline:
+        baseline = report
+        if args.merge_baseline and os.path.exists(args.save_baseline):
+            with open(args.save_baseline, "r") as f:
+                baseline = merge_baseline(json.load(f), report)
+        with open(args.save_baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+        print(f"\n[OK] Baseline saved to {args.save_baseline} "
+              f"({baseline.get('runs', 1)} run(s))")
+
+    if args.compare:
+        if not compare_to_baseline(
+            report, args.compare, args.tolerance, dict(args.op_tolerance)
+        ):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+"""
+Import-time profile for the ASGI entry point.
+
+Runs a fresh interpreter with ``-X importtime``, imports the backend the
+same way a cold serverless invocation does, and prints the slowest modules
+(by cumulative and self time) plus a per-package breakdown.
+
+Run with: python profile_imports.py [--top N] [--statement CODE]
+"""
+
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+# Forces the backend import even when asgi_app defers it
+DEFAULT_STATEMENT = "import asgi_app; asgi_app.load_app()"
+
+
+def run_importtime(statement):
+    """Run ``statement`` under ``-X importtime`` and return its stderr lines."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=Path(__file__).parent,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        # importtime output is on stderr too; show only the traceback tail
+        print("[ERROR] Import failed:")
+        print("\n".join(result.stderr.splitlines()[-10:]))
+        sys.exit(result.returncode)
+    return result.stderr.splitlines()
+
+
+def parse_importtime(lines):
+    """Parse ``-X importtime`` lines into (module, self_us, cumulative_us)."""
+    entries = []
+    for line in lines:
+        if not line.startswith("import time:"):
+            continue
+        fields = line[len("import time:"):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # header row
+        module = fields[2].strip()
+        entries.append((module, int(fields[0]), int(fields[1])))
+    return entries
+
+
+def print_table(title, rows):
+    """Print rows of (name, microseconds) as a millisecond table."""
+    print(f"\n--- {title} ---\n")
+    for name, micros in rows:
+        print(f"  {micros / 1000:9.1f} ms  {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--top", type=int, default=20, help="rows per table")
+    parser.add_argument(
+        "--statement",
+        default=DEFAULT_STATEMENT,
+        help="Python statement to profile (default: full backend import)",
+    )
+    args = parser.parse_args()
+
+    entries = parse_importtime(run_importtime(args.statement))
+    if not entries:
+        print("[ERROR] No import timings captured")
+        sys.exit(1)
+
+    by_package = defaultdict(int)
+    for module, self_us, _ in entries:
+        by_package[module.split(".")[0]] += self_us
+    total_us = sum(by_package.values())
+
+    print("\n" + "=" * 60)
+    print("IMPORT TIME PROFILE")
+    print("=" * 60)
+    print(f"\nStatement: {args.statement}")
+    print(f"Modules imported: {len(entries)}")
+    print(f"Total import time: {total_us / 1000:.1f} ms")
+
+    by_cumulative = sorted(entries, key=lambda e: e[2], reverse=True)
+    print_table(
+        "Slowest modules (cumulative)",
+        [(module, cum) for module, _, cum in by_cumulative[:args.top]],
+    )
+
+    by_self = sorted(entries, key=lambda e: e[1], reverse=True)
+    print_table(
+        "Slowest modules (self)",
+        [(module, self_us) for module, self_us, _ in by_self[:args.top]],
+    )
+
+    packages = sorted(by_package.items(), key=lambda item: item[1], reverse=True)
+    print_table("Time by top-level package", packages[:args.top])
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -59,18 +59,14 @@ async def test_database():
             # Test statistics
             print("\n[STEP 4] Verifying statistics...")
             from sqlmodel import func
-            total_result = await session.execute(select(func.count(Task.id)))
-            total = total_result.scalar() or 0
-
-            pending_result = await session.execute(
-                select(func.count(Task.id)).where(Task.status == "pending")
-            )
-            pending = pending_result.scalar() or 0
-
-            completed_result = await session.execute(
-                select(func.count(Task.id)).where(Task.status == "complete")
+            # One GROUP BY round-trip instead of a count query per status
+            counts_result = await session.execute(
+                select(Task.status, func.count(Task.id)).group_by(Task.status)
             )
-            completed = completed_result.scalar() or 0
+            counts = {status: count for status, count in counts_result.all()}
+            pending = counts.get("pending", 0)
+            completed = counts.get("complete", 0)
+            total = sum(counts.values())
 
             print("[OK] Total: %d, Pending: %d, Completed: %d" % (total, pending, completed))
 